@@ -1,10 +1,48 @@
 ﻿# app/backtest/engine.py
-import csv, json, os
+import csv, json, os, time
+from contextlib import contextmanager
 from typing import List, Dict, Any, Tuple
 from datetime import datetime
 
 ISO = "%Y-%m-%dT%H:%M:%SZ"
 
+class _RunStats:
+    # stage timers + counters for one backtest run; dumped as the run report
+    def __init__(self):
+        self.stages: Dict[str,float] = {}
+        self.counters: Dict[str,int] = {}
+        self.exits: Dict[str,int] = {}
+        self.ticks_scanned: List[int] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - t0)
+
+    def inc(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self) -> Dict[str,Any]:
+        sc = self.ticks_scanned
+        return {
+            "stages_s": {k: round(v, 6) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+            "exits": dict(self.exits),
+            "ticks_scanned": {
+                "total": sum(sc),
+                "min": min(sc) if sc else 0,
+                "max": max(sc) if sc else 0,
+                "mean": round(sum(sc)/len(sc), 3) if sc else 0.0,
+            },
+        }
+
+def report_path_for(out_csv: str) -> str:
+    # artifacts/trades.quick.csv -> artifacts/trades.quick.report.json
+    return os.path.splitext(out_csv)[0] + ".report.json"
+
 def _rget(d, path, default=None):
     cur = d
     for k in path:
@@ -38,6 +76,20 @@ def _load_events(path:str) -> List[Dict[str,Any]]:
     out.sort(key=lambda r: r.get("t",""))
     return out
 
+def _load_events_dir(path:str) -> List[Dict[str,Any]]:
+    # per-pair shards from confluence_v1 --shard-dir; only the shards its
+    # manifest lists, so leftovers from other runs never leak in
+    man_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(man_path):
+        raise RuntimeError(f"[EVENTS_DIR] no manifest.json in {path} (incomplete run?); rerun confluence_v1 --shard-dir")
+    with open(man_path, "r", encoding="utf-8") as f:
+        shards = json.load(f).get("shards") or []
+    out = []
+    for fn in shards:
+        out.extend(_load_events(os.path.join(path, fn)))
+    out.sort(key=lambda r: r.get("t",""))
+    return out
+
 def _load_ticks_csv(path: str) -> List[Tuple[datetime, float]]:
     out = []
     with open(path, "r", encoding="utf-8", newline="") as f:
@@ -136,6 +188,37 @@ def _sim_trade(
             break
 
     exit_ts, exit_px_obs = ticks[exit_idx]
+    bars_held = max(0, exit_idx - i0 + 1)
+
+    return _trade_row(
+        entry_ts, exit_ts, entry_px_obs, exit_px_obs, bars_held, exit_reason,
+        entry_exec=entry_exec, units=units,
+        max_bars=max_bars, tp_mult=tp_mult, sl_pct=sl_pct, trail_frac=trail_frac,
+        late_after_frac=late_after_frac, late_tp_frac=late_tp_frac,
+        slippage_bps=slippage_bps, base_size_usd=base_size_usd, fee_bps=fee_bps,
+    )
+
+def _trade_row(
+    entry_ts: datetime,
+    exit_ts: datetime,
+    entry_px_obs: float,
+    exit_px_obs: float,
+    bars_held: int,
+    exit_reason: str,
+    *,
+    entry_exec: float,
+    units: float,
+    max_bars: int,
+    tp_mult: float,
+    sl_pct: float,
+    trail_frac: float,
+    late_after_frac: float,
+    late_tp_frac: float,
+    slippage_bps: float,
+    base_size_usd: float,
+    fee_bps: float,
+) -> Dict[str,Any]:
+    m = slippage_bps/10000.0
 
     # execution with slippage on exit (sell)
     exit_exec = exit_px_obs * (1 - m)
@@ -150,8 +233,6 @@ def _sim_trade(
     pnl_usd = pnl_usd_gross - fees_usd
     roi_pct = (pnl_usd / base_size_usd) * 100.0 if base_size_usd>0 else 0.0
 
-    bars_held = max(0, exit_idx - i0 + 1)
-
     return {
         "entry_ts": entry_ts.strftime(ISO),
         "exit_ts": exit_ts.strftime(ISO),
@@ -173,89 +254,186 @@ def _sim_trade(
         "max_bars": max_bars,
     }
 
-def run_backtest(cfg: Dict[str,Any]=None) -> int:
-    cfg = cfg or {}
-    ds   = _rget(cfg, ["dataset"], {})
+class LivePosition:
+    # tick-by-tick twin of _sim_trade: same exit priority, O(1) work per tick.
+    # The entry tick itself is the first tick fed to on_tick (as in the backtest).
+    def __init__(self, pair: str, entry_ts: datetime, entry_px_obs: float, **xp):
+        self.pair = pair
+        self.entry_ts = entry_ts
+        self.entry_px_obs = entry_px_obs
+        self.xp = xp
+
+        m = xp["slippage_bps"]/10000.0
+        self.entry_exec = entry_px_obs * (1 + m)
+        self.units = xp["base_size_usd"] / self.entry_exec if self.entry_exec > 0 else 0.0
+
+        tp_mult, sl_pct = xp["tp_mult"], xp["sl_pct"]
+        self.tp_px = entry_px_obs * tp_mult if tp_mult and tp_mult>0 else float("inf")
+        self.sl_px = entry_px_obs * (1 - sl_pct) if sl_pct and sl_pct>0 else -float("inf")
+        self.late_px = entry_px_obs * (1 + xp["late_after_frac"])
+
+        self.high_water = entry_px_obs
+        self.late_active = False
+        self.n = 0  # ticks scanned so far
+
+    def on_tick(self, ts: datetime, px: float):
+        # returns the closed trade row, or None while still open
+        xp = self.xp
+        if self.n >= xp["max_bars"]:
+            # window exhausted: backtest exits on the tick after the window
+            return self._close(ts, px, self.n + 1, "timeout")
+        self.n += 1
+        if px <= 0: return None
+
+        if px > self.high_water:
+            self.high_water = px
+        hw = self.high_water
+
+        if not self.late_active and xp["late_after_frac"] and hw >= self.late_px:
+            self.late_active = True
+
+        if px >= self.tp_px:
+            return self._close(ts, px, self.n, "tp")
+        if self.late_active and xp["late_tp_frac"] and hw>0 and (hw - px)/hw >= xp["late_tp_frac"]:
+            return self._close(ts, px, self.n, "late_tp")
+        if xp["trail_frac"] and hw>0 and px <= hw*(1 - xp["trail_frac"]):
+            return self._close(ts, px, self.n, "trail")
+        if px <= self.sl_px:
+            return self._close(ts, px, self.n, "sl")
+        return None
+
+    def _close(self, ts: datetime, px: float, bars_held: int, reason: str) -> Dict[str,Any]:
+        row = _trade_row(
+            self.entry_ts, ts, self.entry_px_obs, px, bars_held, reason,
+            entry_exec=self.entry_exec, units=self.units, **self.xp,
+        )
+        row["pair"] = self.pair
+        return row
+
+def exit_params(cfg: Dict[str,Any]) -> Dict[str,Any]:
+    # exit/sizing knobs shared by the backtest and the live paper loop
     params = _rget(cfg, ["params"], {})
     bt   = _rget(cfg, ["backtest"], {})
     sim  = _rget(cfg, ["sim"], {})
     risk = _rget(cfg, ["risk"], {})
+    return {
+        "max_bars": int(params.get("max_bars", bt.get("max_bars", 12))),
+        "tp_mult": float(params.get("tp_mult", bt.get("tp_mult", 1.02))),
+        "sl_pct": float(params.get("sl_pct",  bt.get("sl_pct", 0.02))),
+        "trail_frac": float(params.get("trail_frac", sim.get("trail_frac", 0.0))),
+        "late_after_frac": float(params.get("late_tp_after_frac", sim.get("late_tp_after_frac", 0.0))),
+        "late_tp_frac": float(params.get("late_tp_frac",  sim.get("late_tp_frac", 0.0))),
+        "slippage_bps": float(sim.get("slippage_bps", 0)),
+        "base_size_usd": float(risk.get("base_size_usd", 200)),
+        "fee_bps": float(risk.get("fee_bps", 0)),
+    }
+
+def run_backtest(cfg: Dict[str,Any]=None) -> int:
+    cfg = cfg or {}
+    ds   = _rget(cfg, ["dataset"], {})
 
     events_path = ds.get("events_jsonl") or "data/raw/events.jsonl"
+    events_dir  = ds.get("events_dir")  # shards win over events_jsonl
     ticks_dir   = ds.get("ticks_dir") or "data/real/ticks"
     out_csv     = cfg.get("trade_log_csv") or "artifacts/trades.engine.csv"
+    report_json = cfg.get("run_report_json") or report_path_for(out_csv)
 
-    tp_mult = params.get("tp_mult", bt.get("tp_mult", 1.02))
-    sl_pct  = params.get("sl_pct",  bt.get("sl_pct", 0.02))
-    max_bars = int(params.get("max_bars", bt.get("max_bars", 12)))
-
-    late_tp_frac = float(params.get("late_tp_frac",  sim.get("late_tp_frac", 0.0)))
-    late_after_frac = float(params.get("late_tp_after_frac", sim.get("late_tp_after_frac", 0.0)))
-    trail_frac = float(params.get("trail_frac", sim.get("trail_frac", 0.0)))
-
-    slippage_bps = float(sim.get("slippage_bps", 0))
-    base_size_usd = float(risk.get("base_size_usd", 200))
-    fee_bps = float(risk.get("fee_bps", 0))
+    xp = exit_params(cfg)
+    max_bars = xp["max_bars"]
 
     os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+    stats = _RunStats()
+    t_run = time.perf_counter()
 
     # load events
-    events = _load_events(events_path)
+    with stats.stage("load_events"):
+        events = _load_events_dir(events_dir) if events_dir else _load_events(events_path)
+    stats.inc("events", len(events))
 
     # group ticks per pair
     cache_ticks: Dict[str, List[Tuple[datetime,float]]] = {}
 
+    # per-event timings: plain float accumulators, not stats.stage(), to
+    # keep the hot loop close to uninstrumented speed
+    perf = time.perf_counter
+    t_search = 0.0
+    t_sim = 0.0
+
     rows_out: List[Dict[str,Any]] = []
     for ev in events:
         pair = (ev.get("pair") or "").replace("/","_")
         side = ev.get("side","buy")
         if side != "buy":
             # only long simulated for now
+            stats.inc("skip_non_buy")
             continue
         t_event = _parse_iso(ev.get("t"))
 
         tick_path = os.path.join(ticks_dir, f"{pair}.csv")
         if pair not in cache_ticks:
             if not os.path.exists(tick_path):
+                stats.inc("skip_missing_ticks")
                 continue
-            cache_ticks[pair] = _load_ticks_csv(tick_path)
+            with stats.stage("load_ticks"):
+                cache_ticks[pair] = _load_ticks_csv(tick_path)
+            stats.inc("tick_files")
         ticks = cache_ticks[pair]
         if not ticks: 
+            stats.inc("skip_empty_ticks")
             continue
 
+        t0 = perf()
         idx = _find_entry_index(ticks, t_event)
+        t_search += perf() - t0
         if idx < 0: 
+            stats.inc("skip_no_entry")
             continue
 
         entry_ts, entry_px = ticks[idx]
 
-        info = _sim_trade(
-            ticks, idx, entry_ts, entry_px, side,
-            max_bars=max_bars,
-            tp_mult=float(tp_mult),
-            sl_pct=float(sl_pct),
-            trail_frac=trail_frac,
-            late_after_frac=late_after_frac,
-            late_tp_frac=late_tp_frac,
-            slippage_bps=slippage_bps,
-            base_size_usd=base_size_usd,
-            fee_bps=fee_bps,
-        )
+        t0 = perf()
+        info = _sim_trade(ticks, idx, entry_ts, entry_px, side, **xp)
+        t_sim += perf() - t0
         info["pair"] = pair.replace("_","/")
         rows_out.append(info)
 
+        ex = info["exit"]
+        stats.exits[ex] = stats.exits.get(ex, 0) + 1
+        # timeout walks the whole window; other exits stop on the exit bar
+        if ex == "timeout":
+            stats.ticks_scanned.append(max(0, min(idx + max_bars, len(ticks)) - idx))
+        else:
+            stats.ticks_scanned.append(info["bars_held"])
+    stats.inc("trades", len(rows_out))
+    stats.stages["entry_search"] = t_search
+    stats.stages["simulate"] = t_sim
+
     # write CSV
-    if rows_out:
-        fields = list(rows_out[0].keys())
-    else:
-        fields = ["pair","entry_ts","exit_ts","entry_px","exit_px","bars_held","exit",
-                  "pnl_pct","size_usd","pnl_usd","fees_usd","tp_mult","sl_pct",
-                  "trail_frac","late_tp_after_frac","late_tp_frac",
-                  "slippage_bps","fee_bps","max_bars"]
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields)
-        w.writeheader()
-        for r in rows_out:
-            w.writerow(r)
+    with stats.stage("write_csv"):
+        if rows_out:
+            fields = list(rows_out[0].keys())
+        else:
+            fields = ["pair","entry_ts","exit_ts","entry_px","exit_px","bars_held","exit",
+                      "pnl_pct","size_usd","pnl_usd","fees_usd","tp_mult","sl_pct",
+                      "trail_frac","late_tp_after_frac","late_tp_frac",
+                      "slippage_bps","fee_bps","max_bars"]
+        with open(out_csv, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            for r in rows_out:
+                w.writerow(r)
+
+    # run report next to the trade log
+    report = {
+        "events_jsonl": None if events_dir else events_path,
+        "events_dir": events_dir,
+        "ticks_dir": ticks_dir,
+        "trade_log_csv": out_csv,
+        "wall_s": round(time.perf_counter() - t_run, 6),
+    }
+    report.update(stats.report())
+    os.makedirs(os.path.dirname(report_json) or ".", exist_ok=True)
+    with open(report_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
 
     return 0
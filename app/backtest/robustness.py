@@ -0,0 +1,197 @@
+﻿# app/backtest/robustness.py
+# Bootstrap / trade-order permutation analysis of a trade log.
+#
+# summarize() gives one number per metric for the trades in file order; here
+# every resample is a row of a (batch, n_trades) array and the metrics are
+# computed for all rows at once. Batches are sized to a memory budget and
+# each gets its own child seed, so results depend only on `seed`, not on the
+# number of workers.
+import os, json, argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.backtest.metrics import load_trades
+
+METRICS = ("total_pnl_usd", "mdd_pct", "profit_factor", "sharpe")
+
+def trade_arrays(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    rows = load_trades(path)
+    pct = np.fromiter((r["pnl_pct"] for r in rows), dtype=np.float64, count=len(rows))
+    usd = np.fromiter((r["pnl_usd"] for r in rows), dtype=np.float64, count=len(rows))
+    return pct, usd
+
+def batch_metrics(pct: np.ndarray, usd: np.ndarray, inplace: bool = False) -> Dict[str, np.ndarray]:
+    # pct/usd: (b, n) resampled trade sequences; one metric value per row.
+    # Definitions follow metrics.summarize (MDD on cumulative pnl_pct, Sharpe
+    # = mean/std of pnl_pct); profit factor = gross win / gross loss in USD.
+    # inplace=True lets the drawdown pass reuse (clobber) pct.
+    n = pct.shape[1]
+    total = usd.sum(axis=1)
+    gross_win = np.maximum(usd, 0.0).sum(axis=1)
+    gross_loss = gross_win - total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pf = np.where(gross_loss > 0, gross_win / gross_loss, np.where(gross_win > 0, np.inf, 0.0))
+
+    # two-pass variance (E[x^2] - mu^2 cancels badly on near-constant rows)
+    mu = pct.sum(axis=1) / n
+    dev = pct - mu[:, None]
+    std = np.sqrt(np.einsum("ij,ij->i", dev, dev) / n)
+    del dev
+    sharpe = np.where(std > 1e-12, mu / np.where(std > 1e-12, std, 1.0), 0.0)
+
+    return {"total_pnl_usd": total, "mdd_pct": _mdd_rows(pct if inplace else pct.copy()), "profit_factor": pf, "sharpe": sharpe}
+
+def _mdd_rows(pct: np.ndarray) -> np.ndarray:
+    # max drawdown of the cumulative pnl_pct curve per row; overwrites pct
+    eq = np.cumsum(pct, axis=1, out=pct)
+    peak = np.maximum.accumulate(eq, axis=1)
+    np.subtract(peak, eq, out=peak)
+    return peak.max(axis=1)
+
+def _batch(kind: str, pct: np.ndarray, usd: np.ndarray, b: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n = len(pct)
+    if kind == "bootstrap":
+        idx = rng.integers(0, n, size=(b, n), dtype=np.int32 if n < 2**31 else np.int64)
+        return batch_metrics(pct[idx], usd[idx], inplace=True)
+    # reordering leaves total, profit factor and Sharpe unchanged: only the
+    # drawdown needs the shuffled sequences (values shuffled, no index gather)
+    return {"mdd_pct": _mdd_rows(rng.permuted(np.broadcast_to(pct, (b, n)), axis=1))}
+
+# trade arrays for pool workers (set once per process by _init_worker)
+_w_pct: Optional[np.ndarray] = None
+_w_usd: Optional[np.ndarray] = None
+
+def _init_worker(pct: np.ndarray, usd: np.ndarray):
+    global _w_pct, _w_usd
+    _w_pct, _w_usd = pct, usd
+
+def _worker_batch(kind: str, b: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    return _batch(kind, _w_pct, _w_usd, b, seed)
+
+def resample(
+    pct: np.ndarray,
+    usd: np.ndarray,
+    kind: str = "bootstrap",
+    n_resamples: int = 10_000,
+    seed: int = 0,
+    workers: int = 1,
+    max_batch_elems: int = 4_000_000,
+) -> Dict[str, np.ndarray]:
+    # metric distributions over n_resamples bootstrap draws ("bootstrap") or
+    # trade-order shuffles ("permutation")
+    if kind not in ("bootstrap", "permutation"):
+        raise ValueError(f"unknown resample kind '{kind}'")
+    n = len(pct)
+    if n == 0 or n_resamples <= 0:
+        return {m: np.zeros(0) for m in METRICS}
+
+    b = max(1, min(n_resamples, max_batch_elems // n))
+    sizes = [b] * (n_resamples // b)
+    if n_resamples % b:
+        sizes.append(n_resamples % b)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(pct, usd)) as ex:
+            parts = list(ex.map(_worker_batch, [kind]*len(sizes), sizes, seeds))
+    else:
+        parts = [_batch(kind, pct, usd, sz, sd) for sz, sd in zip(sizes, seeds)]
+    out = {m: np.concatenate([p[m] for p in parts]) for m in parts[0]}
+    if kind == "permutation":
+        point = batch_metrics(pct[None, :], usd[None, :])
+        for m in METRICS:
+            if m not in out:
+                out[m] = np.full(n_resamples, point[m][0])
+    return out
+
+def describe(values: np.ndarray, ci: float = 0.95) -> Dict[str, float]:
+    if len(values) == 0:
+        return {"mean": 0.0, "std": 0.0, "ci_lo": 0.0, "median": 0.0, "ci_hi": 0.0}
+    finite = values[np.isfinite(values)]
+    a = (1.0 - ci) / 2.0
+    # sample quantiles (no interpolation): profit factor can be inf
+    lo, med, hi = np.quantile(values, [a, 0.5, 1.0 - a], method="inverted_cdf")
+    return {
+        "mean": round(float(finite.mean()), 4) if len(finite) else float("inf"),
+        "std": round(float(finite.std()), 4) if len(finite) else 0.0,
+        "ci_lo": round(float(lo), 4),
+        "median": round(float(med), 4),
+        "ci_hi": round(float(hi), 4),
+    }
+
+def robustness(
+    path: str,
+    n_resamples: int = 10_000,
+    seed: int = 0,
+    ci: float = 0.95,
+    workers: int = 1,
+) -> Dict[str, Any]:
+    pct, usd = trade_arrays(path)
+    point = {m: float(v[0]) for m, v in batch_metrics(pct[None, :], usd[None, :]).items()} if len(pct) else {m: 0.0 for m in METRICS}
+
+    out: Dict[str, Any] = {
+        "trades": int(len(pct)),
+        "resamples": n_resamples,
+        "seed": seed,
+        "ci": ci,
+        "point": {m: round(v, 4) for m, v in point.items()},
+    }
+    for kind in ("bootstrap", "permutation"):
+        dist = resample(pct, usd, kind, n_resamples, seed, workers)
+        res: Dict[str, Any] = {m: describe(dist[m], ci) for m in METRICS}
+        if len(dist["total_pnl_usd"]):
+            if kind == "bootstrap":
+                # how often the edge disappears when trades are redrawn
+                res["p_total_pnl_le_0"] = round(float((dist["total_pnl_usd"] <= 0).mean()), 4)
+            else:
+                # share of orderings with a drawdown at least as bad as file order
+                res["p_mdd_ge_point"] = round(float((dist["mdd_pct"] >= point["mdd_pct"]).mean()), 4)
+        out[kind] = res
+    return out
+
+def json_safe(obj: Any) -> Any:
+    # strict-JSON copy of a report: non-finite floats (profit factor with no
+    # losing trades is inf) become null
+    if isinstance(obj, dict):
+        return {k: json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [json_safe(v) for v in obj]
+    if isinstance(obj, float) and not np.isfinite(obj):
+        return None
+    return obj
+
+def pretty_print(rep: Dict[str, Any], path: str):
+    name = path.replace("\\\\","/").split("/")[-1]
+    print(f"=== Robustness for {name} ({rep['trades']} trades, {rep['resamples']} resamples, {int(rep['ci']*100)}% CI) ===")
+    for kind in ("bootstrap", "permutation"):
+        r = rep[kind]
+        print(f"--- {kind} ---")
+        for m in METRICS:
+            d = r[m]
+            print(f"{m:14s} : point {rep['point'][m]:>12}  median {d['median']:>12}  [{d['ci_lo']}, {d['ci_hi']}]")
+        for k in ("p_total_pnl_le_0", "p_mdd_ge_point"):
+            if k in r:
+                print(f"{k:14s} : {r[k]}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("trades_csv", nargs="?", default="artifacts/trades.engine.csv")
+    ap.add_argument("-n","--resamples", type=int, default=10_000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--ci", type=float, default=0.95)
+    ap.add_argument("--workers", type=int, default=1, help="process pool size (0 = all cores)")
+    ap.add_argument("--json", help="also write the report here")
+    args = ap.parse_args()
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    rep = robustness(args.trades_csv, args.resamples, args.seed, args.ci, workers)
+    pretty_print(rep, args.trades_csv)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(json_safe(rep), f, indent=2, allow_nan=False)
+
+if __name__ == "__main__":
+    main()
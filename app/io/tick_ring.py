@@ -0,0 +1,281 @@
+﻿# app/io/tick_ring.py
+# Per-symbol shared-memory ring buffers of recent ticks.
+#
+# One writer (the ingest process) per symbol, any number of readers in other
+# processes, no locks. Each segment holds a small uint64 header followed by
+# ts/px float64 arrays of length 2*capacity; every tick is written at slot and
+# slot+capacity, so any window of < capacity consecutive ticks is one
+# contiguous slice and readers get plain NumPy views (no copies, no wrap).
+#
+# Sequence protocol: header[HEAD] counts ticks ever written. The writer fills
+# both copies of slot seq % capacity, then publishes head = seq + 1. While it
+# is writing seq h it clobbers seq h - capacity, so a reader that saw head h
+# may safely use seqs >= h - capacity + 1 -- and must re-check with valid()
+# after using zero-copy views, because a slow reader can be lapped.
+#
+# Restarts: header[EPOCH] is bumped by every new writer and header[CLOSED] is
+# set when a writer stops. A restarted writer reuses the existing segment
+# when the layout matches (readers keep their mapping -- and on Windows the
+# segment cannot be replaced while readers hold it anyway); otherwise it
+# marks the old one closed and creates a new one. Readers notice either in
+# poll()/latest() and re-attach by name, restarting at the oldest tick.
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+MAGIC = 0x5449434B52494E47  # "TICKRING"
+VERSION = 2
+HDR_WORDS = 8
+H_MAGIC, H_VERSION, H_CAP, H_HEAD, H_EPOCH, H_CLOSED = 0, 1, 2, 3, 4, 5
+DEFAULT_PREFIX = "tickring"
+
+class TickWindow(NamedTuple):
+    seq0: int           # sequence number of ts[0]/px[0]
+    ts: np.ndarray      # unix seconds (float64)
+    px: np.ndarray
+    dropped: int = 0    # ticks lost to overrun since the previous poll
+    epoch: int = 0      # writer epoch the views belong to
+
+def segment_name(symbol: str, prefix: str = DEFAULT_PREFIX) -> str:
+    return f"{prefix}_{symbol.upper()}"
+
+def _nbytes(capacity: int) -> int:
+    return 8 * HDR_WORDS + 2 * (8 * 2 * capacity)
+
+def _views(buf, capacity: int):
+    hdr = np.ndarray((HDR_WORDS,), dtype=np.uint64, buffer=buf)
+    off = 8 * HDR_WORDS
+    ts = np.ndarray((2 * capacity,), dtype=np.float64, buffer=buf, offset=off)
+    px = np.ndarray((2 * capacity,), dtype=np.float64, buffer=buf, offset=off + 16 * capacity)
+    return hdr, ts, px
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # readers must not let the resource tracker unlink the writer's segment
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # py3.13+
+    except TypeError:
+        pass
+    # older Pythons register on attach too; skip that registration (not
+    # unregister afterwards, which would drop a forked writer's entry)
+    from multiprocessing import resource_tracker
+    reg = resource_tracker.register
+    def _no_shm(n, rtype):
+        if rtype != "shared_memory":
+            reg(n, rtype)
+    resource_tracker.register = _no_shm
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = reg
+
+def _header(shm: shared_memory.SharedMemory) -> Optional[np.ndarray]:
+    # header view if shm looks like a tick ring of this version, else None
+    if shm.size < 8 * HDR_WORDS:
+        return None
+    hdr = np.ndarray((HDR_WORDS,), dtype=np.uint64, buffer=shm.buf)
+    if int(hdr[H_MAGIC]) != MAGIC or int(hdr[H_VERSION]) != VERSION:
+        return None
+    return hdr
+
+class TickRingWriter:
+    # single producer for one symbol; takes over (or replaces) the segment
+    def __init__(self, symbol: str, capacity: int = 1024, prefix: str = DEFAULT_PREFIX):
+        if capacity < 2:
+            raise ValueError("capacity must be >= 2")
+        self.name = segment_name(symbol, prefix)
+        self.capacity = capacity
+        self.shm, epoch, reused = self._open_segment(capacity)
+        self.hdr, self.ts, self.px = _views(self.shm.buf, capacity)
+        if reused:
+            self.hdr[H_CLOSED] = 1  # readers hold off while we reset
+        else:
+            self.hdr[:] = 0
+        # epoch before head: a reader that sees the reset head also sees the
+        # new epoch on its re-check and resyncs instead of trusting head
+        self.hdr[H_EPOCH] = epoch
+        self.hdr[H_HEAD] = 0
+        self.hdr[H_CAP] = capacity
+        self.hdr[H_VERSION] = VERSION
+        self.hdr[H_MAGIC] = MAGIC  # readers check it before trusting the rest
+        self.hdr[H_CLOSED] = 0
+        self._head = 0
+
+    def _open_segment(self, capacity: int):
+        try:
+            old = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            old = None
+        epoch = 1
+        if old is not None:
+            hdr = _header(old)
+            if hdr is not None:
+                epoch = int(hdr[H_EPOCH]) + 1
+                if int(hdr[H_CAP]) == capacity and old.size >= _nbytes(capacity):
+                    del hdr
+                    return old, epoch, True  # same layout: restart in place
+                hdr[H_CLOSED] = 1  # tell readers of the old layout to re-attach
+                del hdr
+            old.close(); old.unlink()  # no-op on Windows
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=_nbytes(capacity))
+        except FileExistsError:
+            # Windows keeps the segment alive while any reader holds it
+            raise RuntimeError(
+                f"[TICK_RING] {self.name} is still held by readers with a different layout; "
+                f"stop them or keep the previous capacity"
+            )
+        return shm, epoch, False
+
+    def publish(self, ts: float, px: float):
+        seq = self._head
+        cap = self.capacity
+        i = seq % cap
+        self.ts[i] = ts; self.ts[i + cap] = ts
+        self.px[i] = px; self.px[i + cap] = px
+        self._head = seq + 1
+        self.hdr[H_HEAD] = self._head
+
+    def close(self, unlink: bool = True):
+        self.hdr[H_CLOSED] = 1
+        self.hdr = self.ts = self.px = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class TickRingPublisher:
+    # ingest-side registry: one ring per symbol, created on first tick
+    def __init__(self, capacity: int = 1024, prefix: str = DEFAULT_PREFIX):
+        self.capacity = capacity
+        self.prefix = prefix
+        self.rings: Dict[str, TickRingWriter] = {}
+
+    def publish(self, symbol: str, ts: float, px: float):
+        w = self.rings.get(symbol)
+        if w is None:
+            w = self.rings[symbol] = TickRingWriter(symbol, self.capacity, self.prefix)
+        w.publish(ts, px)
+
+    def close(self):
+        for w in self.rings.values():
+            w.close()
+        self.rings.clear()
+
+class TickRingReader:
+    # lock-free consumer; starts at the oldest tick still in the ring and
+    # follows writer restarts (`restarts` counts re-attaches)
+    def __init__(self, symbol: str, prefix: str = DEFAULT_PREFIX):
+        self.name = segment_name(symbol, prefix)
+        self.shm = None
+        self.restarts = 0
+        shm = _attach(self.name)
+        if not self._adopt(shm):
+            raise RuntimeError(f"[TICK_RING] {self.name} is not a live v{VERSION} tick ring")
+
+    def _adopt(self, shm: shared_memory.SharedMemory) -> bool:
+        # switch to shm if it holds a live ring; otherwise close it
+        hdr = _header(shm)
+        if hdr is None or int(hdr[H_CLOSED]):
+            del hdr
+            shm.close()
+            return False
+        cap = int(hdr[H_CAP])
+        del hdr
+        self._release()
+        self.shm = shm
+        self.capacity = cap
+        self.hdr, self.ts, self.px = _views(shm.buf, cap)
+        self.epoch = int(self.hdr[H_EPOCH])
+        self.cursor = self._oldest(self.head())
+        return True
+
+    def _release(self):
+        if self.shm is None: return
+        self.hdr = self.ts = self.px = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # caller still holds views into the old mapping
+        self.shm = None
+
+    def _sync(self) -> bool:
+        # False while there is no live writer; re-attaches after a restart
+        if int(self.hdr[H_EPOCH]) == self.epoch and not int(self.hdr[H_CLOSED]):
+            return True
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return False  # writer gone and not back yet
+        if not self._adopt(shm):
+            return False
+        self.restarts += 1
+        return True
+
+    def head(self) -> int:
+        return int(self.hdr[H_HEAD])
+
+    def _stable_head(self, retries: int = 8) -> Optional[int]:
+        # seqlock-style read: head counts only if epoch/closed are unchanged
+        # after reading it; None while there is no live writer
+        for _ in range(retries):
+            if not self._sync():
+                return None
+            h = self.head()
+            if int(self.hdr[H_EPOCH]) == self.epoch and not int(self.hdr[H_CLOSED]):
+                if h < self.cursor:
+                    # head went backwards under the same epoch: treat as a restart
+                    self.cursor = self._oldest(h)
+                    self.restarts += 1
+                return h
+        return None
+
+    def _oldest(self, head: int) -> int:
+        return max(0, head - self.capacity + 1)
+
+    def _window(self, s0: int, n: int, dropped: int = 0) -> TickWindow:
+        i = s0 % self.capacity
+        return TickWindow(s0, self.ts[i:i + n], self.px[i:i + n], dropped, self.epoch)
+
+    def latest(self, n: int) -> TickWindow:
+        # last n ticks (fewer if the ring holds fewer); does not move the cursor
+        h = self._stable_head()
+        if h is None:
+            return self._window(self.cursor, 0)
+        s0 = max(h - n, self._oldest(h))
+        return self._window(s0, max(0, h - s0))
+
+    def poll(self, max_n: Optional[int] = None) -> TickWindow:
+        # ticks published since the previous poll, oldest first; a reader
+        # that fell more than a ring behind skips ahead and reports `dropped`
+        h = self._stable_head()
+        if h is None:
+            return self._window(self.cursor, 0)
+        s0 = max(self.cursor, self._oldest(h))
+        dropped = s0 - self.cursor
+        n = max(0, h - s0)
+        if max_n is not None:
+            n = min(n, max_n)
+        self.cursor = s0 + n
+        return self._window(s0, n, dropped)
+
+    def valid(self, w: TickWindow) -> bool:
+        # True if the writer has not restarted or started overwriting w
+        hdr = self.hdr
+        return (
+            w.epoch == self.epoch
+            and int(hdr[H_EPOCH]) == self.epoch
+            and not int(hdr[H_CLOSED])
+            and w.seq0 >= self._oldest(self.head())
+        )
+
+    def snapshot(self, n: int, retries: int = 8) -> Optional[TickWindow]:
+        # copied, validated version of latest(); None if lapped every try
+        for _ in range(retries):
+            w = self.latest(n)
+            c = w._replace(ts=w.ts.copy(), px=w.px.copy())
+            if self.valid(w):
+                return c
+        return None
+
+    def close(self):
+        self._release()
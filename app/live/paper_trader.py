@@ -0,0 +1,221 @@
+﻿# app/live/paper_trader.py
+# Live paper-trading loop: WS ticks -> incremental confluence -> paper
+# positions advanced tick by tick with the backtest's exit rules.
+import os, csv, json, math, time, argparse
+from datetime import datetime
+from typing import Dict, List, Any
+
+import yaml
+
+from app.backtest.engine import ISO, LivePosition, exit_params
+from app.signals.confluence_v1 import ConfluenceState
+
+class LatencyHist:
+    # fixed power-of-two microsecond buckets: O(1) per sample, bounded memory;
+    # percentiles are reported as the upper edge of their bucket
+    def __init__(self):
+        self.buckets: Dict[int,int] = {}
+        self.count = 0
+        self.sum_us = 0.0
+        self.max_us = 0.0
+
+    def add(self, seconds: float):
+        us = seconds * 1e6
+        self.count += 1
+        self.sum_us += us
+        if us > self.max_us:
+            self.max_us = us
+        # smallest power of two >= us (1 for anything <= 1us)
+        b = 1 << math.ceil(math.log2(us)) if us > 1 else 1
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def _pct(self, q: float) -> float:
+        if not self.count: return 0.0
+        need = q * self.count
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= need:
+                return float(min(b, self.max_us))
+        return round(self.max_us, 1)
+
+    def summary(self) -> Dict[str,Any]:
+        n = self.count
+        return {
+            "count": n,
+            "mean_us": round(self.sum_us/n, 1) if n else 0.0,
+            "p50_us": round(self._pct(0.50), 1),
+            "p90_us": round(self._pct(0.90), 1),
+            "p99_us": round(self._pct(0.99), 1),
+            "max_us": round(self.max_us, 1),
+            "buckets_us": {f"<={b}": self.buckets[b] for b in sorted(self.buckets)},
+        }
+
+class PaperLoop:
+    def __init__(
+        self,
+        xp: Dict[str,Any],
+        sig_kw: Dict[str,Any],
+        events_out: str,
+        trades_out: str,
+        report_out: str,
+        report_every: int = 1000,
+    ):
+        self.xp = xp
+        self.sig_kw = sig_kw
+        self.report_out = report_out
+        self.report_every = report_every
+
+        self.states: Dict[str, ConfluenceState] = {}
+        self.open: Dict[str, List[LivePosition]] = {}
+        self.sig_lat = LatencyHist()
+        self.exit_lat = LatencyHist()
+        self.n_ticks = 0
+        self.n_events = 0
+        self.exits: Dict[str,int] = {}
+        self.pnl_usd = 0.0
+
+        for p in (events_out, trades_out, report_out):
+            os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+        self._ev_f = open(events_out, "a", encoding="utf-8")
+        new_trades = not os.path.exists(trades_out) or os.path.getsize(trades_out) == 0
+        self._tr_f = open(trades_out, "a", newline="", encoding="utf-8")
+        self._tr_w = None
+        self._tr_header = new_trades
+
+    def on_tick(self, sym: str, ts_iso: str, px: float, t_recv: float):
+        # hook for birdeye_price_ws.add_tick_listener
+        self.n_ticks += 1
+        pair = f"{sym}_USDC"
+        ts = datetime.strptime(ts_iso, ISO)
+
+        still = []
+        for pos in self.open.get(pair, ()):
+            row = pos.on_tick(ts, px)
+            if row is None:
+                still.append(pos)
+            else:
+                self.exit_lat.add(time.perf_counter() - t_recv)
+                self._log_trade(row)
+
+        st = self.states.get(pair)
+        if st is None:
+            st = self.states[pair] = ConfluenceState(pair, **self.sig_kw)
+        ev = st.update(ts_iso, px)
+        if ev is not None:
+            self.sig_lat.add(time.perf_counter() - t_recv)
+            self._log_event(ev)
+            # entry on the signal tick; that tick is also the first one scanned
+            pos = LivePosition(ev["pair"], ts, px, **self.xp)
+            row = pos.on_tick(ts, px)
+            if row is None:
+                still.append(pos)
+            else:
+                self.exit_lat.add(time.perf_counter() - t_recv)
+                self._log_trade(row)
+        self.open[pair] = still
+
+        if self.report_every and self.n_ticks % self.report_every == 0:
+            self.write_report()
+
+    def _log_event(self, ev: Dict[str,Any]):
+        self.n_events += 1
+        self._ev_f.write(json.dumps(ev) + "\n")
+        self._ev_f.flush()
+        print(f"[signal] {ev['pair']} {ev['t']} {ev['price']}")
+
+    def _log_trade(self, row: Dict[str,Any]):
+        if self._tr_w is None:
+            self._tr_w = csv.DictWriter(self._tr_f, fieldnames=list(row.keys()))
+            if self._tr_header:
+                self._tr_w.writeheader()
+        self._tr_w.writerow(row)
+        self._tr_f.flush()
+        self.exits[row["exit"]] = self.exits.get(row["exit"], 0) + 1
+        self.pnl_usd += row["pnl_usd"]
+        print(f"[paper-exit] {row['pair']} {row['exit']} {row['pnl_pct']}% {row['exit_ts']}")
+
+    def write_report(self):
+        rep = {
+            "ticks": self.n_ticks,
+            "events": self.n_events,
+            "closed_trades": sum(self.exits.values()),
+            "open_positions": sum(len(v) for v in self.open.values()),
+            "exits": dict(self.exits),
+            "pnl_usd": round(self.pnl_usd, 2),
+            "tick_to_signal": self.sig_lat.summary(),
+            "tick_to_exit": self.exit_lat.summary(),
+        }
+        with open(self.report_out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+        return rep
+
+    def close(self):
+        self.write_report()
+        self._ev_f.close()
+        self._tr_f.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-c","--config", default="configs/quick.yaml", help="exit/risk params (same yaml as the backtest)")
+    ap.add_argument("--ws-url", help="e.g. ws://127.0.0.1:8765 for app.ws.replay_server")
+    ap.add_argument("--once", action="store_true", help="stop when the feed closes instead of reconnecting")
+    ap.add_argument("--events-out", default="artifacts/paper/events.jsonl")
+    ap.add_argument("--trades-out", default="artifacts/paper/trades.csv")
+    ap.add_argument("--report-out", default="artifacts/paper/latency.json")
+    ap.add_argument("--report-every", type=int, default=1000)
+    ap.add_argument("--ma", type=int, default=20)
+    ap.add_argument("--mom", type=int, default=5)
+    ap.add_argument("--roi-len", type=int, default=3)
+    ap.add_argument("--roi-min", type=float, default=0.01)
+    ap.add_argument("--dedupe-bars", type=int, default=10)
+    args = ap.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+
+    if args.ws_url:
+        os.environ["BIRDEYE_WS_URL"] = args.ws_url
+    # imported late: module reads its env config at import time
+    from app.ws import birdeye_price_ws as feed
+
+    loop = PaperLoop(
+        exit_params(cfg),
+        dict(
+            ma_len=args.ma,
+            momentum_len=args.mom,
+            roi_len=args.roi_len,
+            roi_min=args.roi_min,
+            dedupe_bars=args.dedupe_bars,
+        ),
+        args.events_out, args.trades_out, args.report_out,
+        report_every=args.report_every,
+    )
+    # the ingest service owns the tick CSVs; a replay or a second consumer
+    # must not append the same ticks again
+    feed.WRITE_TICKS = False
+    feed.check_config()
+    feed.add_tick_listener(loop.on_tick)
+    try:
+        backoff = 2
+        while True:
+            try:
+                feed.run_ws()
+                backoff = 2
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print("[ws-run] exception:", e)
+                if args.once: break
+                time.sleep(backoff)
+                backoff = min(60, backoff * 2)
+                continue
+            if args.once: break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+        print("[paper] report", args.report_out)
+
+if __name__ == "__main__":
+    main()
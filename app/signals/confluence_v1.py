@@ -1,5 +1,12 @@
 ﻿import os, csv, json, argparse
-from typing import List, Tuple, Dict, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional
+
+import numpy as np
+
+from app.signals import indicators
+from app.signals.indicators import IndicatorCache, default_cache, file_fingerprint
 
 def read_ticks(path: str) -> List[Tuple[str, float]]:
     out = []
@@ -15,16 +22,7 @@ def read_ticks(path: str) -> List[Tuple[str, float]]:
     return out
 
 def sma(values: List[float], n: int) -> List[float]:
-    if n <= 0: return [0.0]*len(values)
-    out = []
-    s = 0.0
-    q = []
-    for v in values:
-        q.append(v); s += v
-        if len(q) > n:
-            s -= q.pop(0)
-        out.append(s/len(q))
-    return out
+    return indicators.sma(values, n).tolist()
 
 def confluence_events(
     pair: str,
@@ -34,24 +32,31 @@ def confluence_events(
     roi_len: int = 3,
     roi_min: float = 0.01,      # 1% min move over roi_len
     dedupe_bars: int = 10,      # no duplicate signal too soon
+    cache: Optional[IndicatorCache] = None,
+    fp: Optional[str] = None,   # tick file fingerprint (content hash if None)
 ) -> List[Dict[str, Any]]:
     if len(ticks) < max(ma_len, momentum_len, roi_len) + 2:
         return []
     ts = [t for t,_ in ticks]
-    px = [p for _,p in ticks]
-    ma = sma(px, ma_len)
+    ps = (cache or default_cache()).pair(pair, [p for _,p in ticks], fp)
+    px = ps.px
+    ma = ps.sma(ma_len)
+    # "momentum" here is the ROI over momentum_len being > 0, so both checks
+    # share the roi series (and the cache entry when the lengths match)
+    mom = ps.roi(momentum_len)
+    roi = ps.roi(roi_len)
+
+    cross_up = (px[:-1] <= ma[:-1]) & (px[1:] > ma[1:])  # price crosses up MA
+    cand = np.flatnonzero(cross_up & (mom[1:] > 0.0) & (roi[1:] >= roi_min)) + 1
 
     last_signal_idx = -10_000
     events = []
-    for i in range(1, len(px)):
-        cross_up = px[i-1] <= ma[i-1] and px[i] > ma[i]  # price crosses up MA
-        mom_ok = i - momentum_len >= 0 and (px[i] / px[i-momentum_len] - 1.0) > 0.0
-        roi_ok = i - roi_len >= 0 and (px[i] / px[i-roi_len] - 1.0) >= roi_min
-        if cross_up and mom_ok and roi_ok and (i - last_signal_idx >= dedupe_bars):
+    for i in cand.tolist():
+        if i - last_signal_idx >= dedupe_bars:
             events.append({
                 "t": ts[i],
                 "pair": pair.replace("_","/"),
-                "price": round(px[i], 8),
+                "price": round(float(px[i]), 8),
                 "side": "buy",
                 "features": {
                     "ma_len": ma_len,
@@ -65,6 +70,164 @@ def confluence_events(
             last_signal_idx = i
     return events
 
+class ConfluenceState:
+    # streaming twin of confluence_events for one pair: feed ticks one at a
+    # time, get the same events back with O(1) work per tick
+    def __init__(
+        self,
+        pair: str,
+        ma_len: int = 20,
+        momentum_len: int = 5,
+        roi_len: int = 3,
+        roi_min: float = 0.01,
+        dedupe_bars: int = 10,
+    ):
+        self.pair = pair
+        self.ma_len = ma_len
+        self.momentum_len = momentum_len
+        self.roi_len = roi_len
+        self.roi_min = roi_min
+        self.dedupe_bars = dedupe_bars
+
+        self._ma_q: deque = deque()
+        self._ma_sum = 0.0
+        # last max(mom, roi)+1 prices for the lookbacks
+        self._hist: deque = deque(maxlen=max(momentum_len, roi_len, 0) + 1)
+        self._prev_px: Optional[float] = None
+        self._prev_ma: Optional[float] = None
+        self._i = -1
+        self._last_signal_idx = -10_000
+
+    def _ma_push(self, px: float) -> float:
+        if self.ma_len <= 0: return 0.0
+        self._ma_q.append(px); self._ma_sum += px
+        if len(self._ma_q) > self.ma_len:
+            self._ma_sum -= self._ma_q.popleft()
+        return self._ma_sum/len(self._ma_q)
+
+    def update(self, ts: str, px: float) -> Optional[Dict[str, Any]]:
+        if not px > 0: return None  # read_ticks drops these too
+        self._i += 1
+        i = self._i
+        ma = self._ma_push(px)
+        self._hist.append(px)
+
+        ev = None
+        if i >= 1:
+            cross_up = self._prev_px <= self._prev_ma and px > ma
+            mom_ok = i - self.momentum_len >= 0 and (px / self._hist[-1-self.momentum_len] - 1.0) > 0.0
+            roi_ok = i - self.roi_len >= 0 and (px / self._hist[-1-self.roi_len] - 1.0) >= self.roi_min
+            if cross_up and mom_ok and roi_ok and (i - self._last_signal_idx >= self.dedupe_bars):
+                ev = {
+                    "t": ts,
+                    "pair": self.pair.replace("_","/"),
+                    "price": round(px, 8),
+                    "side": "buy",
+                    "features": {
+                        "ma_len": self.ma_len,
+                        "momentum_len": self.momentum_len,
+                        "roi_len": self.roi_len,
+                        "roi_min": self.roi_min,
+                        "dedupe_bars": self.dedupe_bars,
+                        "reason": "ma_cross_up & momentum & roi",
+                    }
+                }
+                self._last_signal_idx = i
+
+        self._prev_px, self._prev_ma = px, ma
+        return ev
+
+SHARD_MANIFEST = "manifest.json"
+
+def read_shard_manifest(shard_dir: str) -> List[str]:
+    # shards a previous run listed (the only files this tool may delete)
+    try:
+        with open(os.path.join(shard_dir, SHARD_MANIFEST), "r", encoding="utf-8") as f:
+            return list(json.load(f).get("shards") or [])
+    except (OSError, ValueError):
+        return []
+
+def write_shard_manifest(
+    shard_dir: str,
+    pairs: List[str],
+    sig_kw: Dict[str, Any],
+    total: int,
+    prev_shards: List[str],
+):
+    # the backtest loads exactly the shards listed here; shards the previous
+    # manifest listed but this run did not produce are removed -- nothing else
+    shards = [f"{p}.jsonl" for p in pairs]
+    man = {"shards": shards, "events": total, "params": sig_kw}
+    tmp = os.path.join(shard_dir, SHARD_MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(man, f, indent=2)
+    os.replace(tmp, os.path.join(shard_dir, SHARD_MANIFEST))
+    keep = set(shards)
+    for fn in prev_shards:
+        if fn in keep or os.path.basename(fn) != fn: continue
+        try:
+            os.remove(os.path.join(shard_dir, fn))
+        except FileNotFoundError:
+            pass
+
+def list_pair_files(ticks_dir: str, max_pairs: int) -> List[Tuple[str, str]]:
+    # (pair, path) for the first max_pairs tick files, sorted by pair
+    out = []
+    for fn in sorted(os.listdir(ticks_dir)):
+        if not fn.lower().endswith(".csv"): continue
+        out.append((os.path.splitext(fn)[0], os.path.join(ticks_dir, fn)))  # e.g. TEST_USDC
+        if len(out) >= max_pairs: break
+    return out
+
+def pair_event_lines(
+    pair: str,
+    path: str,
+    sig_kw: Dict[str, Any],
+    cache: IndicatorCache,
+    shard_dir: Optional[str] = None,
+) -> List[str]:
+    # one pair's events as JSON lines, in time order; optionally also
+    # written to <shard_dir>/<pair>.jsonl for the backtest's events_dir
+    # fingerprint before reading: if the ingest appends meanwhile, the key
+    # stays stale (a later run recomputes) instead of naming the newer file
+    fp = file_fingerprint(path)
+    ticks = read_ticks(path)
+    evs = confluence_events(pair, ticks, cache=cache, fp=fp, **sig_kw)
+    evs.sort(key=lambda e: e["t"])
+    lines = [json.dumps(ev) + "\n" for ev in evs]
+    if shard_dir:
+        with open(os.path.join(shard_dir, f"{pair}.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(lines)
+    return lines
+
+# per-process cache for pool workers (set by _init_worker)
+_worker_cache: Optional[IndicatorCache] = None
+
+def _init_worker(cache_mb: int, cache_dir: Optional[str]):
+    global _worker_cache
+    _worker_cache = IndicatorCache(cache_mb << 20, cache_dir)
+
+def _worker_pair(pair: str, path: str, sig_kw: Dict[str, Any], shard_dir: Optional[str]) -> List[str]:
+    return pair_event_lines(pair, path, sig_kw, _worker_cache, shard_dir)
+
+def _iter_parallel(jobs, sig_kw, shard_dir, workers: int, cache_mb: int, cache_dir: Optional[str]):
+    # yields each pair's lines in job order while at most 4*workers pairs
+    # are in flight, so memory stays bounded however large the universe
+    inflight = deque()
+    max_inflight = 4 * workers
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(cache_mb, cache_dir)) as ex:
+        it = iter(jobs)
+        for pair, path in it:
+            inflight.append(ex.submit(_worker_pair, pair, path, sig_kw, shard_dir))
+            if len(inflight) >= max_inflight:
+                break
+        while inflight:
+            lines = inflight.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                inflight.append(ex.submit(_worker_pair, nxt[0], nxt[1], sig_kw, shard_dir))
+            yield lines
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--ticks-dir", default="data/real/ticks")
@@ -75,31 +238,54 @@ def main():
     ap.add_argument("--roi-min", type=float, default=0.01)
     ap.add_argument("--dedupe-bars", type=int, default=10)
     ap.add_argument("--max-pairs", type=int, default=1000)
+    ap.add_argument("--cache-dir", help="on-disk indicator cache (.npy per series)")
+    ap.add_argument("--cache-mb", type=int, default=256)
+    ap.add_argument("--workers", type=int, default=1, help="process pool size (0 = all cores, 1 = serial)")
+    ap.add_argument("--shard-dir", help="also write per-pair <pair>.jsonl shards (backtest dataset.events_dir)")
     args = ap.parse_args()
 
+    sig_kw = dict(
+        ma_len=args.ma,
+        momentum_len=args.mom,
+        roi_len=args.roi_len,
+        roi_min=args.roi_min,
+        dedupe_bars=args.dedupe_bars,
+    )
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    jobs = list_pair_files(args.ticks_dir, args.max_pairs)
+
     os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    prev_shards: List[str] = []
+    if args.shard_dir:
+        out_dir = os.path.realpath(os.path.dirname(os.path.abspath(args.out)))
+        shard_dir = os.path.realpath(args.shard_dir)
+        if os.path.commonpath([out_dir, shard_dir]) == shard_dir:
+            raise SystemExit(f"[signals] --out {args.out} must not be inside --shard-dir {args.shard_dir}")
+        os.makedirs(args.shard_dir, exist_ok=True)
+        # no manifest until this run completes: a half-written dir is refused
+        man = os.path.join(args.shard_dir, SHARD_MANIFEST)
+        prev_shards = read_shard_manifest(args.shard_dir)
+        if os.path.exists(man):
+            os.remove(man)
+
+    cache = None
+    if workers > 1 and len(jobs) > 1:
+        results = _iter_parallel(jobs, sig_kw, args.shard_dir, workers, args.cache_mb, args.cache_dir)
+    else:
+        cache = IndicatorCache(args.cache_mb << 20, args.cache_dir)
+        results = (pair_event_lines(pair, path, sig_kw, cache, args.shard_dir) for pair, path in jobs)
+
+    # output order: by pair, then time -- identical for any worker count
     total = 0
     with open(args.out, "w", encoding="utf-8") as outf:
-        count_pairs = 0
-        for fn in os.listdir(args.ticks_dir):
-            if not fn.lower().endswith(".csv"): continue
-            pair = os.path.splitext(fn)[0]      # e.g. TEST_USDC
-            path = os.path.join(args.ticks_dir, fn)
-            ticks = read_ticks(path)
-            evs = confluence_events(
-                pair, ticks,
-                ma_len=args.ma,
-                momentum_len=args.mom,
-                roi_len=args.roi_len,
-                roi_min=args.roi_min,
-                dedupe_bars=args.dedupe_bars,
-            )
-            for ev in evs:
-                outf.write(json.dumps(ev) + "\n")
-            total += len(evs)
-            count_pairs += 1
-            if count_pairs >= args.max_pairs: break
-    print(f"[signals] wrote {total} events to {args.out}")
+        for lines in results:
+            outf.writelines(lines)
+            total += len(lines)
+    if args.shard_dir:
+        write_shard_manifest(args.shard_dir, [pair for pair, _ in jobs], sig_kw, total, prev_shards)
+    print(f"[signals] wrote {total} events from {len(jobs)} pairs to {args.out} (workers={workers})")
+    if cache is not None:
+        print(f"[signals] indicator cache {cache.stats()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,203 @@
+﻿# app/signals/indicators.py
+# Shared indicator layer: SMA / EMA / momentum / ROI series computed once per
+# (pair, tick-series fingerprint, indicator, length) and reused by every
+# strategy or parameter variant that asks for them.
+import os, hashlib
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+def sma(px: Sequence[float], n: int) -> np.ndarray:
+    # running-sum SMA over the last n values (shorter window while warming up)
+    if n <= 0: return np.zeros(len(px))
+    out = []
+    s = 0.0
+    q: deque = deque()
+    for v in px:
+        q.append(v); s += v
+        if len(q) > n:
+            s -= q.popleft()
+        out.append(s/len(q))
+    return np.array(out, dtype=np.float64)
+
+def ema(px: Sequence[float], n: int) -> np.ndarray:
+    # classic EMA, alpha = 2/(n+1), seeded with the first value
+    if n <= 0 or len(px) == 0: return np.zeros(len(px))
+    a = 2.0/(n+1)
+    out = []
+    e = float(px[0])
+    for v in px:
+        e += a*(v - e)
+        out.append(e)
+    return np.array(out, dtype=np.float64)
+
+def mom(px: Sequence[float], n: int) -> np.ndarray:
+    # price change over n bars; NaN until n bars of history
+    if n < 0: raise ValueError("length must be >= 0")
+    p = np.asarray(px, dtype=np.float64)
+    out = np.full(len(p), np.nan)
+    out[n:] = p[n:] - p[:len(p)-n]
+    return out
+
+def roi(px: Sequence[float], n: int) -> np.ndarray:
+    # fractional return over n bars (px[i]/px[i-n] - 1); NaN until n bars
+    if n < 0: raise ValueError("length must be >= 0")
+    p = np.asarray(px, dtype=np.float64)
+    out = np.full(len(p), np.nan)
+    out[n:] = p[n:] / p[:len(p)-n] - 1.0
+    return out
+
+INDICATORS = {"sma": sma, "ema": ema, "mom": mom, "roi": roi}
+
+def file_fingerprint(path: str) -> str:
+    # cheap identity of a tick file: "<source>-<state>", where source hashes
+    # the absolute path and state hashes size + mtime. The disk cache prunes
+    # old states of the same source only, so tick dirs sharing a cache dir
+    # never evict each other.
+    st = os.stat(path)
+    src = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=6).hexdigest()
+    state = hashlib.blake2b(f"{st.st_size}|{st.st_mtime_ns}".encode(), digest_size=6).hexdigest()
+    return f"{src}-{state}"
+
+def series_fingerprint(px: np.ndarray) -> str:
+    # content identity for series that did not come from a file
+    return hashlib.blake2b(np.ascontiguousarray(px).tobytes(), digest_size=8).hexdigest()
+
+Key = Tuple[str, str, str, int]
+
+class PairSeries:
+    # one pair's price series bound to a cache; strategies ask this for inputs
+    def __init__(self, cache: "IndicatorCache", pair: str, px: np.ndarray, fp: str):
+        self.cache = cache
+        self.pair = pair
+        self.px = px
+        self.fp = fp
+
+    def get(self, kind: str, n: int) -> np.ndarray:
+        return self.cache.get(self.pair, self.fp, self.px, kind, n)
+
+    def sma(self, n: int) -> np.ndarray: return self.get("sma", n)
+    def ema(self, n: int) -> np.ndarray: return self.get("ema", n)
+    def mom(self, n: int) -> np.ndarray: return self.get("mom", n)
+    def roi(self, n: int) -> np.ndarray: return self.get("roi", n)
+
+class IndicatorCache:
+    # memory-bounded LRU of read-only series, optionally backed by .npy files
+    def __init__(self, max_bytes: int = 256 << 20, cache_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._lru: "OrderedDict[Key, np.ndarray]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.computed = 0
+        self._pruned = set()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def pair(self, pair: str, px: Sequence[float], fp: Optional[str] = None) -> PairSeries:
+        arr = np.asarray(px, dtype=np.float64)
+        return PairSeries(self, pair, arr, fp or series_fingerprint(arr))
+
+    def get(self, pair: str, fp: str, px: np.ndarray, kind: str, n: int) -> np.ndarray:
+        if kind not in INDICATORS:
+            raise ValueError(f"unknown indicator '{kind}' (have {sorted(INDICATORS)})")
+        key = (pair, fp, kind, int(n))
+        arr = self._lru.get(key)
+        if arr is not None:
+            if len(arr) == len(px):
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return arr
+            # same key, different series (file changed under its fingerprint)
+            del self._lru[key]
+            self.nbytes -= arr.nbytes
+
+        arr = self._load(key, len(px))
+        if arr is None:
+            arr = INDICATORS[kind](px, int(n))
+            self.computed += 1
+            self._save(key, arr)
+        else:
+            self.disk_hits += 1
+        arr.flags.writeable = False
+        self._put(key, arr)
+        return arr
+
+    def _put(self, key: Key, arr: np.ndarray):
+        if arr.nbytes > self.max_bytes:
+            return  # would evict everything else; hand it out uncached
+        self._lru[key] = arr
+        self.nbytes += arr.nbytes
+        while self.nbytes > self.max_bytes:
+            _, old = self._lru.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def _path(self, key: Key) -> str:
+        pair, fp, kind, n = key
+        return os.path.join(self.cache_dir, f"{pair}__{fp}__{kind}{n}.npy")
+
+    def _load(self, key: Key, length: int) -> Optional[np.ndarray]:
+        if not self.cache_dir: return None
+        try:
+            arr = np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        return arr if arr.ndim == 1 and len(arr) == length else None
+
+    def _save(self, key: Key, arr: np.ndarray):
+        # only file-backed series go to disk: content-hashed ones have no
+        # source to prune by and would pile up
+        if not self.cache_dir or "-" not in key[1]: return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, arr, allow_pickle=False)
+            os.replace(tmp, path)  # atomic for concurrent writers
+        except OSError:
+            return
+        self._prune(key[0], key[1])
+
+    def _prune(self, pair: str, fp: str):
+        # tick files are appended continuously, so each refresh brings a new
+        # state: keep only the current one per (pair, source file) on disk
+        if (pair, fp) in self._pruned: return
+        self._pruned.add((pair, fp))
+        src = fp.split("-", 1)[0]
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for fn in names:
+            parts = fn.split("__")
+            if (len(parts) == 3 and fn.endswith(".npy") and parts[0] == pair
+                    and parts[1] != fp and parts[1].split("-", 1)[0] == src):
+                try:
+                    os.remove(os.path.join(self.cache_dir, fn))
+                except OSError:
+                    pass
+
+    def clear(self):
+        self._lru.clear()
+        self.nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "series": len(self._lru),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "computed": self.computed,
+        }
+
+_default: Optional[IndicatorCache] = None
+
+def default_cache() -> IndicatorCache:
+    # process-wide cache; INDICATOR_CACHE_MB / INDICATOR_CACHE_DIR tune it
+    global _default
+    if _default is None:
+        mb = int(os.getenv("INDICATOR_CACHE_MB", "256"))
+        _default = IndicatorCache(mb << 20, os.getenv("INDICATOR_CACHE_DIR") or None)
+    return _default
@@ -20,28 +20,57 @@ TOKENS = {
 # --- config from env ---
 API_KEY = os.getenv("BIRDEYE_API_KEY", "").strip()
 OUT_DIR = os.getenv("TICKS_OUT_DIR", "data/real/ticks")
-WS_URL  = f"wss://public-api.birdeye.so/socket/solana?x-api-key={API_KEY}"
+WRITE_TICKS = os.getenv("TICKS_WRITE_CSV", "1") != "0"  # consumers (paper trader) turn this off
+RING_CAPACITY = int(os.getenv("TICK_RING_CAPACITY", "1024"))  # 0 = no shared-memory rings
+WS_URL  = os.getenv("BIRDEYE_WS_URL", "").strip() or f"wss://public-api.birdeye.so/socket/solana?x-api-key={API_KEY}"
 
 # Birdeye v3 OHLCV (used only for optional sanity checks)
 OHLCV_V3 = "https://public-api.birdeye.so/defi/v3/ohlcv"
 
-# guard: show config once
-print(f"[cfg] out_dir = {OUT_DIR}")
-print(f"[cfg] tokens  = {TOKENS}")
-print(f"[cfg] ws_url  = wss://public-api.birdeye.so/socket/solana?x-api-key={'<hidden>' if API_KEY else '<missing>'}")
+addr_to_sym = {v: k for k, v in TOKENS.items()}
+last_min_written = {sym: None for sym in TOKENS}
 
-if not API_KEY:
-    raise SystemExit("BIRDEYE_API_KEY missing")
+# in-process consumers of accepted ticks: fn(sym, ts_iso, price, t_recv)
+# t_recv is time.perf_counter() taken when the WS frame arrived
+tick_listeners = []
 
-Path(OUT_DIR).mkdir(parents=True, exist_ok=True)
+def add_tick_listener(fn):
+    tick_listeners.append(fn)
 
-addr_to_sym = {v: k for k, v in TOKENS.items()}
-last_min_written = {sym: None for sym in TOKENS}
+def check_config():
+    # guard: show config once
+    print(f"[cfg] out_dir = {OUT_DIR}")
+    print(f"[cfg] tokens  = {TOKENS}")
+    if WS_URL.startswith("wss://public-api.birdeye.so"):
+        print(f"[cfg] ws_url  = wss://public-api.birdeye.so/socket/solana?x-api-key={'<hidden>' if API_KEY else '<missing>'}")
+        if not API_KEY:
+            raise SystemExit("BIRDEYE_API_KEY missing")
+    else:
+        print(f"[cfg] ws_url  = {WS_URL}")
+
+    if WRITE_TICKS:
+        Path(OUT_DIR).mkdir(parents=True, exist_ok=True)
 
 def unix_to_iso_z(t: int) -> str:
     # timezone-aware (UTC) → ISO Z
     return dt.datetime.fromtimestamp(t, tz=dt.timezone.utc).isoformat().replace("+00:00", "Z")
 
+def iso_z_to_unix(s: str) -> float:
+    return dt.datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp()
+
+def start_tick_rings(capacity: int = RING_CAPACITY):
+    # publish every accepted tick into per-symbol shared-memory rings
+    # (app.io.tick_ring) so other processes can read without tailing CSVs
+    if capacity <= 0:
+        return None
+    from app.io.tick_ring import TickRingPublisher  # numpy only when enabled
+    pub = TickRingPublisher(capacity)
+    def _publish(sym, ts_iso, price, t_recv):
+        pub.publish(sym, iso_z_to_unix(ts_iso), price)
+    add_tick_listener(_publish)
+    print(f"[cfg] tick rings = {capacity} ticks/symbol (shm prefix '{pub.prefix}')")
+    return pub
+
 def build_complex_query(addresses):
     # (address = <mint> AND chartType = 1m AND currency = usd) OR ...
     parts = [f"(address = {a} AND chartType = 1m AND currency = usd)" for a in addresses]
@@ -65,6 +94,7 @@ def on_open(ws):
     send_subscribe_all(ws)
 
 def on_message(ws, message):
+    t_recv = time.perf_counter()
     try:
         obj = json.loads(message)
     except Exception:
@@ -97,9 +127,18 @@ def on_message(ws, message):
             return
         last_min_written[sym] = minute_key
 
+        # in-process consumers first, disk after; a failing listener must
+        # not cost us the tick on disk (the minute is already marked written)
+        for fn in tick_listeners:
+            try:
+                fn(sym, ts_iso, float(c), t_recv)
+            except Exception as e:
+                print(f"[listener-error] {getattr(fn, '__qualname__', fn)} {sym} {ts_iso}: {e!r}")
+
         # write
-        write_tick(OUT_DIR, sym, ts_iso, float(c))
-        print(f"[write-ws] {sym:4s} {ts_iso} {c}")
+        if WRITE_TICKS:
+            write_tick(OUT_DIR, sym, ts_iso, float(c))
+            print(f"[write-ws] {sym:4s} {ts_iso} {c}")
 
 def on_error(ws, err):
     print("[ws-error]", err)
@@ -107,7 +146,7 @@ def on_error(ws, err):
 def on_close(ws, code, reason):
     print("[ws-close]", code, reason)
 
-def run_ws():
+def run_ws(url: str = None):
     headers = [
         "Origin: https://birdeye.so",
         f"X-API-KEY: {API_KEY}",
@@ -115,7 +154,7 @@ def run_ws():
     ]
     websocket.enableTrace(False)  # set True if you want raw frames again
     ws = websocket.WebSocketApp(
-        WS_URL,
+        url or WS_URL,
         header=headers,
         on_open=on_open,
         on_message=on_message,
@@ -169,21 +208,27 @@ def sanity_loop():
         time.sleep(60)
 
 def main():
+    check_config()
+    rings = start_tick_rings()
     # run ws in main thread, sanity checker in background
     t = threading.Thread(target=sanity_loop, daemon=True)
     t.start()
     # backoff reconnect loop
     backoff = 2
-    while True:
-        try:
-            run_ws()
-            backoff = 2
-        except KeyboardInterrupt:
-            raise
-        except Exception as e:
-            print("[ws-run] exception:", e)
-            time.sleep(backoff)
-            backoff = min(60, backoff * 2)
+    try:
+        while True:
+            try:
+                run_ws()
+                backoff = 2
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print("[ws-run] exception:", e)
+                time.sleep(backoff)
+                backoff = min(60, backoff * 2)
+    finally:
+        if rings is not None:
+            rings.close()
 
 if __name__ == "__main__":
     main()
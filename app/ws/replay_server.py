@@ -0,0 +1,157 @@
+﻿# app/ws/replay_server.py
+# Tiny local WebSocket server that replays tick CSVs as Birdeye PRICE_DATA
+# frames, so the live pipeline can be exercised without an API key.
+import os, csv, json, time, heapq, socket, struct, base64, hashlib, argparse
+import datetime as dt
+from typing import List, Tuple, Iterator
+
+from app.ws.birdeye_price_ws import TOKENS
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def _iso_to_unix(s: str) -> int:
+    s = s.strip().replace("Z", "+00:00")
+    d = dt.datetime.fromisoformat(s)
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=dt.timezone.utc)
+    return int(d.timestamp())
+
+def read_tick_rows(path: str) -> List[Tuple[int, float]]:
+    # write_tick appends "ts,price" without a header; tolerate one anyway
+    out = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for r in csv.reader(f):
+            if len(r) < 2: continue
+            try:
+                out.append((_iso_to_unix(r[0]), float(r[1])))
+            except Exception:
+                continue
+    out.sort(key=lambda t: t[0])
+    return out
+
+def merged_ticks(ticks_dir: str) -> Iterator[Tuple[int, str, float]]:
+    # all symbols interleaved by time: (unix, address, price)
+    streams = []
+    for fn in sorted(os.listdir(ticks_dir)):
+        if not fn.endswith("_USDC.csv"): continue
+        sym = fn[:-len("_USDC.csv")]
+        addr = TOKENS.get(sym)
+        if addr is None:
+            print(f"[replay] skip {fn}: {sym} not in TOKENS")
+            continue
+        rows = read_tick_rows(os.path.join(ticks_dir, fn))
+        streams.append([(u, addr, px) for u, px in rows])
+    return heapq.merge(*streams, key=lambda t: t[0])
+
+# --- minimal RFC 6455 framing (server side: unmasked out, masked in) ---
+def _send_frame(conn: socket.socket, payload: bytes, opcode: int = 0x1):
+    n = len(payload)
+    if n < 126:
+        hdr = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        hdr = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        hdr = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    conn.sendall(hdr + payload)
+
+def _recv_exact(conn: socket.socket, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("client closed")
+        buf += chunk
+    return buf
+
+def _recv_frame(conn: socket.socket) -> Tuple[int, bytes]:
+    b0, b1 = _recv_exact(conn, 2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", _recv_exact(conn, 2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", _recv_exact(conn, 8))[0]
+    mask = _recv_exact(conn, 4) if b1 & 0x80 else b"\0\0\0\0"
+    data = bytes(c ^ mask[i % 4] for i, c in enumerate(_recv_exact(conn, n)))
+    return b0 & 0x0F, data
+
+def _handshake(conn: socket.socket):
+    req = b""
+    while b"\r\n\r\n" not in req:
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionError("client closed during handshake")
+        req += chunk
+    headers = {}
+    for ln in req.decode("latin-1").split("\r\n")[1:]:
+        if ":" in ln:
+            k, v = ln.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    key = headers.get("sec-websocket-key", "")
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    resp = [
+        "HTTP/1.1 101 Switching Protocols",
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        f"Sec-WebSocket-Accept: {accept}",
+    ]
+    if "sec-websocket-protocol" in headers:
+        resp.append(f"Sec-WebSocket-Protocol: {headers['sec-websocket-protocol']}")
+    conn.sendall(("\r\n".join(resp) + "\r\n\r\n").encode())
+
+def serve_one(conn: socket.socket, ticks_dir: str, speed: float):
+    _handshake(conn)
+    _send_frame(conn, json.dumps({"type": "WELCOME"}).encode())
+
+    # wait for the client's SUBSCRIBE_PRICE before streaming
+    while True:
+        op, data = _recv_frame(conn)
+        if op == 0x8:
+            return
+        if op == 0x9:
+            _send_frame(conn, data, 0xA)
+            continue
+        if op == 0x1 and b"SUBSCRIBE_PRICE" in data:
+            break
+
+    sent = 0
+    prev_u = None
+    for u, addr, px in merged_ticks(ticks_dir):
+        if speed > 0 and prev_u is not None and u > prev_u:
+            time.sleep((u - prev_u) / speed)
+        prev_u = u
+        msg = {"type": "PRICE_DATA", "data": {"address": addr, "c": px, "unixTime": u, "type": "1m"}}
+        _send_frame(conn, json.dumps(msg).encode())
+        sent += 1
+    _send_frame(conn, struct.pack("!H", 1000), 0x8)
+    print(f"[replay] sent {sent} ticks")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks-dir", default="data/real/ticks")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--speed", type=float, default=0.0, help="replay speed-up vs tick time (0 = as fast as possible)")
+    ap.add_argument("--once", action="store_true", help="exit after the first client")
+    args = ap.parse_args()
+
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind((args.host, args.port))
+    srv.listen(1)
+    print(f"[replay] ws://{args.host}:{args.port} <- {args.ticks_dir}")
+    try:
+        while True:
+            conn, _ = srv.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                serve_one(conn, args.ticks_dir, args.speed)
+            except (ConnectionError, OSError) as e:
+                print("[replay] client dropped:", e)
+            finally:
+                conn.close()
+            if args.once: break
+    finally:
+        srv.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+﻿# tests/conftest.py
+import os, sys
+
+# make `app` importable when pytest is run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
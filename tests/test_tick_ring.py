@@ -0,0 +1,135 @@
+﻿# tests/test_tick_ring.py
+import os, itertools
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from app.io.tick_ring import H_HEAD, TickRingWriter, TickRingReader, segment_name
+
+_n = itertools.count()
+
+@pytest.fixture
+def sym():
+    # unique segment per test (and per process) so runs never collide;
+    # unlinked afterwards even if the test left a writer open
+    s = f"T{os.getpid()}X{next(_n)}"
+    yield s
+    try:
+        shm = shared_memory.SharedMemory(name=segment_name(s))
+        shm.close(); shm.unlink()
+    except FileNotFoundError:
+        pass
+
+def _publish(w, start, stop):
+    for i in range(start, stop):
+        w.publish(float(i), float(i))
+
+def test_poll_streams_in_order(sym):
+    w = TickRingWriter(sym, capacity=16)
+    r = TickRingReader(sym)
+    _publish(w, 0, 5)
+    a = r.poll()
+    assert (a.seq0, a.px.tolist(), a.dropped) == (0, [0, 1, 2, 3, 4], 0)
+    _publish(w, 5, 8)
+    b = r.poll()
+    assert (b.seq0, b.px.tolist(), b.dropped) == (5, [5, 6, 7], 0)
+    assert r.valid(b)
+    assert len(r.poll().px) == 0
+    del a, b
+    r.close(); w.close()
+
+def test_lapped_reader_skips_ahead_and_reports_drops(sym):
+    w = TickRingWriter(sym, capacity=8)
+    r = TickRingReader(sym)
+    _publish(w, 0, 3)
+    r.poll()                      # cursor = 3
+    _publish(w, 3, 40)            # laps the reader several times
+    got = r.poll()
+    # oldest safe seq is head - capacity + 1 = 33
+    assert got.seq0 == 33
+    assert got.dropped == 30
+    assert got.px.tolist() == [float(i) for i in range(33, 40)]
+    assert r.cursor == 40
+
+def test_views_invalidated_when_writer_laps_them(sym):
+    w = TickRingWriter(sym, capacity=8)
+    r = TickRingReader(sym)
+    _publish(w, 0, 6)
+    win = r.latest(6)
+    assert r.valid(win)
+    _publish(w, 6, 10)            # overwrites seqs 0..2
+    assert not r.valid(win)
+    snap = r.snapshot(4)
+    assert snap.px.tolist() == [6.0, 7.0, 8.0, 9.0]
+
+def test_wrap_gives_contiguous_views(sym):
+    w = TickRingWriter(sym, capacity=8)
+    r = TickRingReader(sym)
+    _publish(w, 0, 13)            # head wraps past the end of the ring
+    win = r.latest(7)
+    assert win.seq0 == 6
+    assert np.array_equal(win.ts, np.arange(6, 13, dtype=float))
+
+def test_reader_follows_in_place_restart(sym):
+    w = TickRingWriter(sym, capacity=16)
+    r = TickRingReader(sym)
+    _publish(w, 0, 30)
+    r.poll()
+    assert r.cursor == 30
+    w2 = TickRingWriter(sym, capacity=16)   # crash-restart: same layout, reused
+    _publish(w2, 100, 103)
+    got = r.poll()
+    assert r.restarts == 1
+    assert (got.seq0, got.px.tolist()) == (0, [100.0, 101.0, 102.0])
+    assert r.cursor == 3
+
+def test_restart_between_sync_and_head_read(sym):
+    # writer restarts after the reader's epoch check but before it reads head:
+    # the reader must not label old ticks with its stale cursor
+    w = TickRingWriter(sym, capacity=16)
+    r = TickRingReader(sym)
+    _publish(w, 0, 30)
+    r.poll()
+    orig = r._sync
+    state = {}
+    def racy_sync():
+        ok = orig()
+        if "w2" not in state:
+            state["w2"] = TickRingWriter(sym, capacity=16)
+        return ok
+    r._sync = racy_sync
+    got = r.poll()
+    assert len(got.px) == 0
+    assert got.seq0 == 0 and r.cursor == 0
+    _publish(state["w2"], 200, 202)
+    got = r.poll()
+    assert (got.seq0, got.px.tolist()) == (0, [200.0, 201.0])
+
+def test_head_behind_cursor_is_treated_as_restart(sym):
+    w = TickRingWriter(sym, capacity=16)
+    r = TickRingReader(sym)
+    _publish(w, 0, 30)
+    r.poll()
+    # head moves backwards without an epoch bump (e.g. a torn restart)
+    w._head = 0
+    w.hdr[H_HEAD] = 0
+    _publish(w, 500, 502)
+    got = r.poll()
+    assert got.seq0 == 0
+    assert got.px.tolist() == [500.0, 501.0]
+    assert r.restarts == 1
+
+def test_reader_waits_while_writer_closed(sym):
+    w = TickRingWriter(sym, capacity=8)
+    r = TickRingReader(sym)
+    _publish(w, 0, 4)
+    r.poll()
+    w.close()
+    assert len(r.poll().px) == 0
+    w2 = TickRingWriter(sym, capacity=8)
+    _publish(w2, 9, 11)
+    got = r.poll()
+    assert got.px.tolist() == [9.0, 10.0]
+    assert r.restarts == 1
+    r.close(); w2.close()
@@ -1,16 +1,56 @@
 ﻿# tools/run_cfg.py
-import os, yaml, argparse, importlib
+import os, io, yaml, argparse, importlib
 
 CANDIDATES = [
     ("app.backtest.engine", "run_backtest"),
     ("app.backtest.runner_impl", "run_backtest"),
 ]
 
+def run_profiled(fn, cfg, out):
+    # cProfile around one run; stats saved next to the trade log
+    import cProfile, pstats
+    base = os.path.splitext(out)[0]
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        fn(cfg)
+    finally:
+        prof.disable()
+
+    prof.dump_stats(base + ".prof")
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+    with open(base + ".profile.txt", "w", encoding="utf-8") as f:
+        f.write(buf.getvalue())
+    print("[profile]", base + ".prof")
+
+def run_memtraced(fn, cfg, out):
+    # tracemalloc around one run (separate pass: its allocation hooks
+    # would skew a CPU profile taken at the same time)
+    import tracemalloc
+    base = os.path.splitext(out)[0]
+    tracemalloc.start()
+    try:
+        fn(cfg)
+    finally:
+        snap = tracemalloc.take_snapshot()
+        cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    with open(base + ".mem.txt", "w", encoding="utf-8") as f:
+        f.write(f"current_bytes {cur}\npeak_bytes {peak}\n\n")
+        for st in snap.statistics("lineno")[:30]:
+            f.write(f"{st}\n")
+    print("[profile-mem]", base + ".mem.txt")
+    print("[profile-mem] peak_mem_bytes", peak)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("-c","--config", required=True)
     ap.add_argument("-o","--out")
     ap.add_argument("--entry")
+    ap.add_argument("--profile", action="store_true", help="wrap run in cProfile")
+    ap.add_argument("--profile-mem", action="store_true", help="wrap run in tracemalloc (extra pass if --profile too)")
     args = ap.parse_args()
 
     with open(args.config, "r", encoding="utf-8") as f:
@@ -39,7 +79,13 @@ def main():
         if fn is None:
             raise RuntimeError("No suitable engine found. Pass --entry module:function")
 
-    fn(cfg)
+    if args.profile or args.profile_mem:
+        if args.profile:
+            run_profiled(fn, cfg, out)
+        if args.profile_mem:
+            run_memtraced(fn, cfg, out)
+    else:
+        fn(cfg)
     print("[entry]", tag)
     print("[wrote]", out)
 